@@ -2,33 +2,90 @@
 Belt Monitor REST API
 FastAPI-based API for conveyor belt monitoring system
 """
+import asyncio
 import os
-import shutil
+import pickle
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Iterator, Optional, List, Tuple
 import logging
+import multiprocessing
 
+import aiofiles
 from fastapi import FastAPI, File, UploadFile, HTTPException, Query, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
 from app.belt_analyzer import BeltAnalyzer, AnalysisResult
 from app.report_generator import ReportGenerator
+from app.video_worker import run_video_analysis
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Worker processes for CPU-bound video analysis (created on first use)
+_video_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_video_executor() -> ProcessPoolExecutor:
+    """Return the shared video analysis process pool"""
+    global _video_executor
+    if _video_executor is None:
+        # Spawned workers don't inherit the server's threads and locks; they
+        # import only app.video_worker, never this module
+        _video_executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _video_executor
+
+
+async def _analyze_video_in_pool(video_path: str, analyzer_config: dict, sample_rate: int) -> AnalysisResult:
+    """Run video analysis in the process pool, recreating the pool once if a worker died"""
+    global _video_executor
+    for attempt in range(2):
+        executor = _get_video_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, run_video_analysis, video_path, analyzer_config, sample_rate
+            )
+        except BrokenProcessPool:
+            logger.warning("Video worker process died, recreating the process pool")
+            if _video_executor is executor:
+                _video_executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            if attempt:
+                raise
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Drop stale spilled results on startup; stop video worker processes on shutdown"""
+    global _video_executor
+    analysis_results.remove_stale_spills()
+    yield
+    if _video_executor is not None:
+        _video_executor.shutdown(wait=False, cancel_futures=True)
+        _video_executor = None
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Belt Monitor API",
     description="System monitorowania szerokości taśmy przenośnika - API REST",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -46,6 +103,15 @@ REPORTS_DIR = Path("reports")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# On-disk cache of image analysis results (same image + same parameters)
+IMAGE_CACHE_DIR = Path("data/cache")
+
+# Chunk size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Downloaded reports are transient, so favour fast Excel compression
+REPORT_COMPRESSION_LEVEL = 1
+
 # Mount static files for frontend
 STATIC_DIR = Path("static")
 if STATIC_DIR.exists():
@@ -54,9 +120,135 @@ if STATIC_DIR.exists():
 else:
     logger.warning(f"Static directory not found at {STATIC_DIR}")
 
-# In-memory storage for results (in production, use a database)
-analysis_results = {}
 
+class ResultStore:
+    """
+    Size-bounded LRU storage for analysis results.
+    Least recently used results are pickled to spill_dir on eviction and
+    loaded back transparently on lookup, so memory stays bounded. At most
+    max_spilled results are kept on disk; the oldest spills are dropped.
+    A small metadata index serves listings without unpickling anything.
+    """
+    
+    def __init__(self, maxsize: int, spill_dir: Path, max_spilled: int = 1024):
+        self.maxsize = maxsize
+        self.max_spilled = max_spilled
+        self.spill_dir = spill_dir
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._items: "OrderedDict[str, AnalysisResult]" = OrderedDict()
+        self._spilled: "OrderedDict[str, None]" = OrderedDict()
+        self._summaries: Dict[str, dict] = {}
+    
+    def _spill_path(self, analysis_id: str) -> Path:
+        return self.spill_dir / f"{analysis_id}.pkl"
+    
+    def _spill(self, analysis_id: str, result: AnalysisResult) -> None:
+        with open(self._spill_path(analysis_id), "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spilled[analysis_id] = None
+        while len(self._spilled) > self.max_spilled:
+            expired_id, _ = self._spilled.popitem(last=False)
+            self._spill_path(expired_id).unlink(missing_ok=True)
+            self._summaries.pop(expired_id, None)
+    
+    def remove_stale_spills(self) -> None:
+        """Delete spill files that aren't in the index (left by a previous process)"""
+        for path in self.spill_dir.glob("*.pkl"):
+            if path.stem not in self._spilled:
+                path.unlink(missing_ok=True)
+    
+    def __contains__(self, analysis_id: str) -> bool:
+        return analysis_id in self._items or analysis_id in self._spilled
+    
+    def __getitem__(self, analysis_id: str) -> AnalysisResult:
+        if analysis_id in self._items:
+            self._items.move_to_end(analysis_id)
+            return self._items[analysis_id]
+        
+        if analysis_id not in self._spilled:
+            raise KeyError(analysis_id)
+        path = self._spill_path(analysis_id)
+        del self._spilled[analysis_id]
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except Exception as e:
+            # A missing or corrupt spill is a lost result, not a server error
+            logger.warning(f"Dropping unreadable spilled result {analysis_id}: {e}")
+            path.unlink(missing_ok=True)
+            del self._summaries[analysis_id]
+            raise KeyError(analysis_id) from e
+        path.unlink()
+        self[analysis_id] = result
+        return result
+    
+    def __setitem__(self, analysis_id: str, result: AnalysisResult) -> None:
+        self._items[analysis_id] = result
+        self._items.move_to_end(analysis_id)
+        if analysis_id in self._spilled:
+            del self._spilled[analysis_id]
+            self._spill_path(analysis_id).unlink(missing_ok=True)
+        self._summaries[analysis_id] = {
+            "source_file": result.source_file,
+            "created_at": result.created_at,
+            "total_segments": len(result.segments),
+            "fps": result.fps
+        }
+        while len(self._items) > self.maxsize:
+            evicted_id, evicted = self._items.popitem(last=False)
+            self._spill(evicted_id, evicted)
+    
+    def __delitem__(self, analysis_id: str) -> None:
+        found = self._items.pop(analysis_id, None) is not None
+        if analysis_id in self._spilled:
+            del self._spilled[analysis_id]
+            self._spill_path(analysis_id).unlink(missing_ok=True)
+            found = True
+        if not found:
+            raise KeyError(analysis_id)
+        del self._summaries[analysis_id]
+    
+    def summaries(self) -> Iterator[Tuple[str, dict]]:
+        """Iterate over metadata of all stored results, in memory or spilled"""
+        yield from list(self._summaries.items())
+
+
+# Bounded storage for results (in production, use a database)
+RESULTS_DIR = Path("data/results")
+MAX_CACHED_RESULTS = int(os.getenv("MAX_CACHED_RESULTS", "128"))
+MAX_SPILLED_RESULTS = int(os.getenv("MAX_SPILLED_RESULTS", "1024"))
+analysis_results = ResultStore(MAX_CACHED_RESULTS, RESULTS_DIR, MAX_SPILLED_RESULTS)
+
+# Generated report files keyed by (analysis_id, format); results don't
+# change once stored, so a report is only generated on its first download
+REPORT_CACHE: Dict[Tuple[str, str], str] = {}
+REPORT_FORMATS = ("xlsx", "csv")
+
+
+def _get_result(analysis_id: str) -> AnalysisResult:
+    """Stored result for an analysis, or a 404 if it is unknown or was lost"""
+    try:
+        return analysis_results[analysis_id]
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+
+def _get_report_path(analysis_id: str, fmt: str) -> str:
+    """Return report file for an analysis, generating it on first request"""
+    key = (analysis_id, fmt)
+    filepath = REPORT_CACHE.get(key)
+    if filepath is not None and os.path.exists(filepath):
+        return filepath
+    
+    result = _get_result(analysis_id)
+    generator = ReportGenerator(str(REPORTS_DIR), excel_compression_level=REPORT_COMPRESSION_LEVEL)
+    if fmt == "xlsx":
+        filepath = generator.generate_excel(result, f"report_{analysis_id}.xlsx")
+    else:
+        filepath = generator.generate_csv(result, f"report_{analysis_id}.csv")
+    
+    REPORT_CACHE[key] = filepath
+    return filepath
 
 
 # Pydantic models
@@ -167,31 +359,34 @@ async def analyze_media(
             detail=f"Unsupported file type. Allowed: {allowed_extensions}"
         )
     
-    # Save uploaded file
     analysis_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     file_path = UPLOAD_DIR / f"{analysis_id}{file_ext}"
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
         # Configure analyzer
         roi = None
         if all([roi_x is not None, roi_y is not None, roi_w is not None, roi_h is not None]):
             roi = (roi_x, roi_y, roi_w, roi_h)
         
-        analyzer = BeltAnalyzer(
-            min_width_threshold=min_width_threshold,
-            max_width_threshold=max_width_threshold,
-            seam_detection_threshold=seam_threshold,
-            roi=roi
-        )
+        analyzer_config = {
+            "min_width_threshold": min_width_threshold,
+            "max_width_threshold": max_width_threshold,
+            "seam_detection_threshold": seam_threshold,
+            "roi": roi
+        }
         
-        # Run analysis
+        # Run analysis off the event loop: images are decoded from memory and
+        # analyzed in the thread pool, videos are saved and go to worker processes
         if file_ext in {'.jpg', '.jpeg', '.png', '.bmp'}:
-            result = analyzer.analyze_image(str(file_path))
+            data = await file.read()
+            analyzer = BeltAnalyzer(**analyzer_config, cache_dir=str(IMAGE_CACHE_DIR))
+            result = await run_in_threadpool(analyzer.analyze_image_bytes, data, file.filename)
         else:
-            result = analyzer.analyze_video(str(file_path), sample_rate=sample_rate)
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await buffer.write(chunk)
+            
+            result = await _analyze_video_in_pool(str(file_path), analyzer_config, sample_rate)
         
         # Store result
         analysis_results[analysis_id] = result
@@ -211,7 +406,7 @@ async def analyze_media(
                     min_width_px=round(s.min_width, 2),
                     max_width_px=round(s.max_width, 2),
                     avg_width_px=round(s.avg_width, 2),
-                    measurement_count=len(s.widths)
+                    measurement_count=s.measurement_count
                 )
                 for s in result.segments
             ],
@@ -233,7 +428,7 @@ async def analyze_media(
         logger.error(f"Analysis failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        # Cleanup uploaded file
+        # Cleanup uploaded video
         if file_path.exists():
             file_path.unlink()
 
@@ -241,10 +436,7 @@ async def analyze_media(
 @app.get("/api/v1/results/{analysis_id}", response_model=AnalysisResponse)
 async def get_result(analysis_id: str):
     """Get analysis result by ID"""
-    if analysis_id not in analysis_results:
-        raise HTTPException(status_code=404, detail="Analysis not found")
-    
-    result = analysis_results[analysis_id]
+    result = _get_result(analysis_id)
     return AnalysisResponse(
         analysis_id=analysis_id,
         source_file=result.source_file,
@@ -259,7 +451,7 @@ async def get_result(analysis_id: str):
                 min_width_px=round(s.min_width, 2),
                 max_width_px=round(s.max_width, 2),
                 avg_width_px=round(s.avg_width, 2),
-                measurement_count=len(s.widths)
+                measurement_count=s.measurement_count
             )
             for s in result.segments
         ],
@@ -279,15 +471,10 @@ async def get_result(analysis_id: str):
 @app.get("/api/v1/results")
 async def list_results():
     """List all analysis results with metadata"""
-    results_list = []
-    for aid, result in analysis_results.items():
-        results_list.append({
-            "analysis_id": aid,
-            "source_file": getattr(result, "source_file", "unknown"),
-            "created_at": getattr(result, "created_at", datetime.now().isoformat()), # Fallback if not stored
-            "total_segments": len(result.segments),
-            "fps": result.fps
-        })
+    results_list = [
+        {"analysis_id": aid, **summary}
+        for aid, summary in analysis_results.summaries()
+    ]
     
     return {
         "count": len(results_list),
@@ -301,10 +488,7 @@ async def get_excel_report(analysis_id: str):
     if analysis_id not in analysis_results:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    result = analysis_results[analysis_id]
-    generator = ReportGenerator(str(REPORTS_DIR))
-    
-    filepath = generator.generate_excel(result, f"report_{analysis_id}.xlsx")
+    filepath = _get_report_path(analysis_id, "xlsx")
     
     return FileResponse(
         filepath,
@@ -319,10 +503,7 @@ async def get_csv_report(analysis_id: str):
     if analysis_id not in analysis_results:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    result = analysis_results[analysis_id]
-    generator = ReportGenerator(str(REPORTS_DIR))
-    
-    filepath = generator.generate_csv(result, f"report_{analysis_id}.csv")
+    filepath = _get_report_path(analysis_id, "csv")
     
     return FileResponse(
         filepath,
@@ -334,11 +515,8 @@ async def get_csv_report(analysis_id: str):
 @app.get("/api/v1/reports/{analysis_id}/json")
 async def get_json_report(analysis_id: str):
     """Generate and return JSON report"""
-    if analysis_id not in analysis_results:
-        raise HTTPException(status_code=404, detail="Analysis not found")
-    
-    result = analysis_results[analysis_id]
-    return result.to_dict()
+    result = _get_result(analysis_id)
+    return ORJSONResponse(result.to_dict())
 
 
 @app.delete("/api/v1/results/{analysis_id}")
@@ -348,6 +526,13 @@ async def delete_result(analysis_id: str):
         raise HTTPException(status_code=404, detail="Analysis not found")
     
     del analysis_results[analysis_id]
+    
+    # Drop cached report files
+    for fmt in REPORT_FORMATS:
+        filepath = REPORT_CACHE.pop((analysis_id, fmt), None)
+        if filepath is not None and os.path.exists(filepath):
+            os.unlink(filepath)
+    
     return {"message": f"Analysis {analysis_id} deleted"}
 
 
@@ -4,41 +4,159 @@ Detects belt edges, measures width, identifies segments (seams)
 """
 import cv2
 import numpy as np
-from dataclasses import dataclass, field
-from typing import List, Tuple, Optional
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import Iterable, Iterator, List, Tuple, Optional
 from datetime import datetime
+from pathlib import Path
+import hashlib
 import logging
+import os
+import pickle
+import queue
+import tempfile
+import threading
+from collections import OrderedDict
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class SegmentMeasurement:
-    """Single segment measurement data"""
-    segment_id: int
-    frame_start: int
-    frame_end: int
-    widths: List[float] = field(default_factory=list)
+    """
+    Single segment measurement data.
+    Widths are appended via add_width(), which keeps running min/max and
+    Welford mean/variance accumulators so the statistics below are O(1).
+    """
+    __slots__ = ('segment_id', 'frame_start', 'frame_end',
+                 '_n', '_mean', '_m2', '_min', '_max', '_widths')
+    
+    # Starting buffer size; doubled when full, so short segments stay small
+    _INITIAL_CAPACITY = 16
+    
+    def __init__(
+        self,
+        segment_id: int,
+        frame_start: int,
+        frame_end: int,
+        widths: Optional[Iterable[float]] = None
+    ):
+        self.segment_id = segment_id
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = 0.0
+        self._max = 0.0
+        self._widths = np.empty(self._INITIAL_CAPACITY, dtype=np.float32)
+        
+        for w in widths or ():
+            self.add_width(w)
+    
+    def __repr__(self) -> str:
+        return (f"SegmentMeasurement(segment_id={self.segment_id}, "
+                f"frame_start={self.frame_start}, frame_end={self.frame_end}, "
+                f"measurement_count={self._n})")
+    
+    def __getstate__(self) -> dict:
+        # Pickle only the recorded widths, not the spare buffer capacity
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['_widths'] = self._widths[:self._n].copy()
+        return state
+    
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+    
+    def add_width(self, width: float) -> None:
+        """Record a single width measurement"""
+        width = float(width)
+        n = self._n
+        
+        # Grow buffer by doubling when full
+        if n == len(self._widths):
+            grown = np.empty(max(2 * n, self._INITIAL_CAPACITY), dtype=np.float32)
+            grown[:n] = self._widths
+            self._widths = grown
+        self._widths[n] = width
+        
+        if n == 0:
+            self._min = self._max = width
+        elif width < self._min:
+            self._min = width
+        elif width > self._max:
+            self._max = width
+        
+        # Welford update: numerically stable single-pass mean/variance
+        self._n = n + 1
+        delta = width - self._mean
+        self._mean += delta / self._n
+        self._m2 += delta * (width - self._mean)
+    
+    @property
+    def widths(self) -> np.ndarray:
+        """Recorded widths (view into the internal buffer)"""
+        return self._widths[:self._n]
+    
+    @property
+    def measurement_count(self) -> int:
+        return self._n
     
     @property
     def min_width(self) -> float:
-        return min(self.widths) if self.widths else 0.0
+        return self._min
     
     @property
     def max_width(self) -> float:
-        return max(self.widths) if self.widths else 0.0
+        return self._max
     
     @property
     def avg_width(self) -> float:
-        return sum(self.widths) / len(self.widths) if self.widths else 0.0
+        return self._mean
     
     @property
     def width_variance(self) -> float:
-        if len(self.widths) < 2:
+        if self._n < 2:
             return 0.0
-        avg = self.avg_width
-        return sum((w - avg) ** 2 for w in self.widths) / len(self.widths)
+        return self._m2 / self._n
+
+
+@dataclass(frozen=True)
+class SegmentArrays:
+    """
+    Column-wise (structure of arrays) copy of a result's segments, so
+    reports compute on whole columns instead of per-segment objects
+    """
+    ids: np.ndarray
+    frame_start: np.ndarray
+    frame_end: np.ndarray
+    min_w: np.ndarray
+    max_w: np.ndarray
+    avg_w: np.ndarray
+    var: np.ndarray
+    count: np.ndarray
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @classmethod
+    def from_segments(cls, segments: List[SegmentMeasurement]) -> "SegmentArrays":
+        n = len(segments)
+        
+        def column(attr: str, dtype) -> np.ndarray:
+            return np.fromiter((getattr(s, attr) for s in segments), dtype=dtype, count=n)
+        
+        return cls(
+            ids=column("segment_id", np.int64),
+            frame_start=column("frame_start", np.int64),
+            frame_end=column("frame_end", np.int64),
+            min_w=column("min_width", np.float64),
+            max_w=column("max_width", np.float64),
+            avg_w=column("avg_width", np.float64),
+            var=column("width_variance", np.float64),
+            count=column("measurement_count", np.int64)
+        )
 
 
 @dataclass
@@ -51,7 +169,18 @@ class AnalysisResult:
     alerts: List[dict] = field(default_factory=list)
     created_at: str = field(default_factory=lambda: datetime.now().isoformat())
     
+    @cached_property
+    def segment_arrays(self) -> SegmentArrays:
+        """Columnar segment data, built once on first use"""
+        return SegmentArrays.from_segments(self.segments)
+    
     def to_dict(self) -> dict:
+        # Results are not modified after analysis, so the serialized form is
+        # built once; a shallow copy lets callers add top-level keys
+        return dict(self._serialized)
+    
+    @cached_property
+    def _serialized(self) -> dict:
         return {
             "source_file": self.source_file,
             "total_frames": self.total_frames,
@@ -65,7 +194,7 @@ class AnalysisResult:
                     "min_width_px": round(s.min_width, 2),
                     "max_width_px": round(s.max_width, 2),
                     "avg_width_px": round(s.avg_width, 2),
-                    "measurement_count": len(s.widths)
+                    "measurement_count": s.measurement_count
                 }
                 for s in self.segments
             ],
@@ -79,13 +208,37 @@ class BeltAnalyzer:
     Detects belt edges and seams to measure width per segment.
     """
     
+    # Scale factor applied to frames before Canny/Hough seam detection
+    SEAM_DOWNSCALE = 0.25
+    
+    # Number of decoded frames buffered ahead of analysis
+    FRAME_QUEUE_SIZE = 8
+    
+    # Consecutive failed width measurements after which only the cheap
+    # intensity-change seam check is run
+    SEAM_LINE_CHECK_MAX_MISSES = 10
+    
+    # Edge cache is switched off if its hit rate is below this after enough lookups
+    EDGE_CACHE_MIN_HIT_RATE = 0.3
+    EDGE_CACHE_MIN_LOOKUPS = 100
+    
+    # Most recent image results kept in cache_dir; older files are pruned
+    IMAGE_CACHE_MAX_FILES = 256
+    
+    # Part of the image cache key; bump whenever analysis results change, so
+    # cache files from an older release are not served after a deploy
+    IMAGE_CACHE_VERSION = 1
+    
     def __init__(
         self,
         min_width_threshold: float = 100.0,
         max_width_threshold: float = 2000.0,
         seam_detection_threshold: float = 0.3,
         calibration_px_per_mm: float = 1.0,
-        roi: Optional[Tuple[int, int, int, int]] = None
+        roi: Optional[Tuple[int, int, int, int]] = None,
+        use_cuda: bool = False,
+        edge_cache_size: int = 0,
+        cache_dir: Optional[str] = None
     ):
         self.min_width_threshold = min_width_threshold
         self.max_width_threshold = max_width_threshold
@@ -93,31 +246,74 @@ class BeltAnalyzer:
         self.calibration = calibration_px_per_mm
         self.roi = roi  # (x, y, width, height)
         
-    def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
-        """Preprocess frame for belt detection"""
+        # Optional GPU seam detection (Canny + Hough); falls back to CPU when
+        # OpenCV is built without CUDA or no device is present
+        self.use_cuda = use_cuda and self._cuda_available()
+        if use_cuda and not self.use_cuda:
+            logger.warning("CUDA requested but not available, using CPU")
+        self._gpu_frame = None
+        self._gpu_canny = None
+        self._gpu_hough = None
+        self._gpu_hough_key: Optional[Tuple[int, int, int]] = None
+        
+        # Optional LRU of belt edges keyed by a coarse frame thumbnail, for
+        # mostly static footage; trades a little accuracy for skipping the
+        # preprocessing on near-identical frames (0 = disabled)
+        self.edge_cache_size = edge_cache_size
+        self._edge_cache: OrderedDict = OrderedDict()
+        self._edge_cache_hits = 0
+        self._edge_cache_lookups = 0
+        
+        # Optional on-disk cache of analyze_image results
+        self.cache_dir = cache_dir
+        
+        # Reused across frames: morphology kernel and two working buffers
+        # (allocated lazily to match the frame size)
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        self._buf_tmp: Optional[np.ndarray] = None
+        self._buf_bin: Optional[np.ndarray] = None
+        self._consecutive_misses = 0
+        
+    @staticmethod
+    def _to_gray(frame: np.ndarray) -> np.ndarray:
+        """Convert BGR frame to grayscale (no-op for single-channel input)"""
+        if len(frame.shape) == 3:
+            return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+    
+    def _crop(self, frame: np.ndarray) -> np.ndarray:
+        """Apply ROI if set"""
         if self.roi:
             x, y, w, h = self.roi
-            frame = frame[y:y+h, x:x+w]
+            return frame[y:y+h, x:x+w]
+        return frame
+        
+    def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
+        """Preprocess frame for belt detection"""
+        return self._binarize(self._to_gray(self._crop(frame))).copy()
+    
+    def _binarize(self, gray: np.ndarray) -> np.ndarray:
+        """
+        Binarize an already cropped grayscale frame.
+        Returns an internal buffer that is overwritten by the next call.
+        """
+        if self._buf_bin is None or self._buf_bin.shape != gray.shape:
+            self._buf_tmp = np.empty(gray.shape, dtype=np.uint8)
+            self._buf_bin = np.empty(gray.shape, dtype=np.uint8)
+        tmp, binary = self._buf_tmp, self._buf_bin
         
-        # Convert to grayscale
-        if len(frame.shape) == 3:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = frame
-            
         # Apply Gaussian blur
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        cv2.GaussianBlur(gray, (5, 5), 0, dst=tmp)
         
         # Adaptive thresholding for belt edge detection
-        binary = cv2.adaptiveThreshold(
-            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV, 11, 2
+        cv2.adaptiveThreshold(
+            tmp, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, 11, 2, dst=binary
         )
         
         # Morphological operations to clean up
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+        cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._morph_kernel, dst=tmp)
+        cv2.morphologyEx(tmp, cv2.MORPH_OPEN, self._morph_kernel, dst=binary)
         
         return binary
     
@@ -126,42 +322,62 @@ class BeltAnalyzer:
         Detect left and right edges of the belt.
         Returns (left_edge, right_edge) in pixels.
         """
-        # Find contours
-        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if not contours:
-            return None, None
-        
-        # Find the largest contour (assumed to be the belt)
-        largest_contour = max(contours, key=cv2.contourArea)
-        
-        # Get bounding rectangle
-        x, y, w, h = cv2.boundingRect(largest_contour)
-        
-        # Edge detection using horizontal projection
+        # Edge detection using horizontal projection (int32 column sums kept
+        # in raw 0/255 units, so the threshold is scaled instead)
         height = binary.shape[0]
-        projection = np.sum(binary, axis=0) / 255
-        
-        # Find edges where projection drops
-        threshold = height * 0.3
-        left_edge = None
-        right_edge = None
-        
-        for i in range(len(projection)):
-            if projection[i] > threshold and left_edge is None:
-                left_edge = i
-            if projection[len(projection) - 1 - i] > threshold and right_edge is None:
-                right_edge = len(projection) - 1 - i
-            if left_edge is not None and right_edge is not None:
-                break
-        
-        return left_edge, right_edge
+        projection = cv2.reduce(binary, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+
+        # Find edges: first and last column whose projection exceeds threshold
+        threshold = int(height * 0.3 * 255)
+        columns = np.flatnonzero(projection > threshold)
+
+        if columns.size == 0:
+            return None, None
+
+        return int(columns[0]), int(columns[-1])
     
     def measure_width(self, frame: np.ndarray) -> Optional[float]:
         """Measure belt width in a single frame"""
-        binary = self.preprocess_frame(frame)
-        left, right = self.detect_belt_edges(binary)
+        return self._width_from_binary(self._binarize(self._to_gray(self._crop(frame))))
+    
+    def _width_from_binary(self, binary: np.ndarray) -> Optional[float]:
+        """Measure and validate belt width from a preprocessed binary frame"""
+        return self._width_from_edges(*self.detect_belt_edges(binary))
+    
+    def _width_from_gray(self, gray: np.ndarray) -> Optional[float]:
+        """Measure belt width from a cropped grayscale frame, using the edge cache if enabled"""
+        if not self.edge_cache_size:
+            return self._width_from_binary(self._binarize(gray))
+        
+        thumbnail = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA)
+        key = (gray.shape, thumbnail.tobytes())
+        self._edge_cache_lookups += 1
+        edges = self._edge_cache.get(key)
+        if edges is not None:
+            self._edge_cache_hits += 1
+            self._edge_cache.move_to_end(key)
+        else:
+            edges = self.detect_belt_edges(self._binarize(gray))
+            self._edge_cache[key] = edges
+            if len(self._edge_cache) > self.edge_cache_size:
+                self._edge_cache.popitem(last=False)
+            
+            if (self._edge_cache_lookups >= self.EDGE_CACHE_MIN_LOOKUPS
+                    and self.edge_cache_hit_rate < self.EDGE_CACHE_MIN_HIT_RATE):
+                logger.info(f"Edge cache hit rate {self.edge_cache_hit_rate:.0%} too low, disabling")
+                self.edge_cache_size = 0
+                self._edge_cache.clear()
         
+        return self._width_from_edges(*edges)
+    
+    @property
+    def edge_cache_hit_rate(self) -> float:
+        if not self._edge_cache_lookups:
+            return 0.0
+        return self._edge_cache_hits / self._edge_cache_lookups
+    
+    def _width_from_edges(self, left: Optional[int], right: Optional[int]) -> Optional[float]:
+        """Validate belt width from detected edges"""
         if left is None or right is None:
             return None
             
@@ -173,29 +389,47 @@ class BeltAnalyzer:
             
         return width
     
-    def detect_seam(self, frame: np.ndarray, prev_frame: Optional[np.ndarray]) -> bool:
+    def detect_seam(
+        self,
+        gray_curr: np.ndarray,
+        gray_prev: Optional[np.ndarray],
+        check_lines: bool = True
+    ) -> bool:
         """
         Detect if there's a seam (segment boundary) between frames.
-        Uses intensity change detection and horizontal line detection.
+        Uses intensity change detection and horizontal line detection
+        (skipped when check_lines is False).
+        Expects grayscale frames; BGR input is converted as a fallback.
         """
-        if prev_frame is None:
+        if gray_prev is None:
             return False
             
-        # Convert to grayscale if needed
-        if len(frame.shape) == 3:
-            gray_curr = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray_prev = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-        else:
-            gray_curr = frame
-            gray_prev = prev_frame
+        gray_curr = self._to_gray(gray_curr)
+        gray_prev = self._to_gray(gray_prev)
+        
+        # Cheap check first: overall intensity change between frames
+        # (L1 norm = sum of absolute differences, without a diff buffer)
+        mean_diff = cv2.norm(gray_curr, gray_prev, cv2.NORM_L1) / float(gray_curr.size)
+        if mean_diff > self.seam_detection_threshold * 255:
+            return True
+        
+        if not check_lines:
+            return False
         
-        # Calculate frame difference
-        diff = cv2.absdiff(gray_curr, gray_prev)
+        # Check for horizontal line (seam indicator) on a downscaled frame;
+        # Hough parameters are scaled to match the full-resolution ones
+        scale = self.SEAM_DOWNSCALE
+        small = cv2.resize(gray_curr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        threshold = max(int(100 * scale), 1)
+        min_line_length = int(small.shape[1] * 0.5)
+        max_line_gap = max(int(round(10 * scale)), 1)
         
-        # Check for horizontal line (seam indicator)
-        edges = cv2.Canny(gray_curr, 50, 150)
-        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=100,
-                                minLineLength=frame.shape[1]*0.5, maxLineGap=10)
+        if self.use_cuda:
+            lines = self._cuda_line_segments(small, threshold, min_line_length, max_line_gap)
+        else:
+            edges = cv2.Canny(small, 50, 150)
+            lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=threshold,
+                                    minLineLength=min_line_length, maxLineGap=max_line_gap)
         
         # Check for significant horizontal lines
         if lines is not None:
@@ -204,14 +438,132 @@ class BeltAnalyzer:
                 angle = abs(np.arctan2(y2-y1, x2-x1))
                 if angle < 0.1:  # Nearly horizontal
                     return True
-        
-        # Alternative: Check intensity change
-        mean_diff = np.mean(diff)
-        if mean_diff > self.seam_detection_threshold * 255:
-            return True
             
         return False
     
+    @staticmethod
+    def _cuda_available() -> bool:
+        try:
+            return cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except (AttributeError, cv2.error):
+            return False
+    
+    def _cuda_line_segments(
+        self, gray: np.ndarray, threshold: int, min_line_length: int, max_line_gap: int
+    ) -> Optional[np.ndarray]:
+        """Canny + probabilistic Hough on the GPU; same output layout as HoughLinesP"""
+        if self._gpu_frame is None:
+            self._gpu_frame = cv2.cuda_GpuMat()
+            self._gpu_canny = cv2.cuda.createCannyEdgeDetector(50, 150)
+        
+        # Segment detector depends on frame width, so rebuild only when it changes
+        key = (threshold, min_line_length, max_line_gap)
+        if self._gpu_hough_key != key:
+            self._gpu_hough = cv2.cuda.createHoughSegmentDetector(
+                1.0, np.pi/180, min_line_length, max_line_gap, 4096, threshold
+            )
+            self._gpu_hough_key = key
+        
+        self._gpu_frame.upload(gray)
+        edges = self._gpu_canny.detect(self._gpu_frame)
+        segments = self._gpu_hough.detect(edges)
+        if segments.empty():
+            return None
+        return segments.download().reshape(-1, 1, 4)
+    
+    def _process_frame(
+        self, frame: np.ndarray, prev_gray: Optional[np.ndarray]
+    ) -> Tuple[Optional[float], bool, np.ndarray]:
+        """
+        Run width measurement and seam detection on an already cropped frame,
+        converting it to grayscale only once.
+        Returns (width, is_seam, gray) - gray is kept as the next prev_gray.
+        """
+        gray = self._to_gray(frame)
+        width = self._width_from_gray(gray)
+        
+        # While the belt is not visible (camera obscured, belt absent) skip
+        # the expensive Hough line check and rely on the intensity change only
+        if width is None:
+            self._consecutive_misses += 1
+        else:
+            self._consecutive_misses = 0
+        check_lines = self._consecutive_misses <= self.SEAM_LINE_CHECK_MAX_MISSES
+        
+        is_seam = self.detect_seam(gray, prev_gray, check_lines=check_lines)
+        return width, is_seam, gray
+    
+    @staticmethod
+    def _open_video(video_path: str) -> cv2.VideoCapture:
+        """
+        Open video with the FFmpeg backend, asking for hardware-accelerated
+        decoding (VAAPI/NVDEC/D3D11 where available; OpenCV silently falls back
+        to software decoding otherwise). Uses the default backend if FFmpeg
+        cannot open the file.
+        """
+        hw_props = getattr(cv2, "CAP_PROP_HW_ACCELERATION", None)
+        if hw_props is not None:
+            cap = cv2.VideoCapture(
+                video_path, cv2.CAP_FFMPEG,
+                [hw_props, cv2.VIDEO_ACCELERATION_ANY]
+            )
+            if cap.isOpened():
+                return cap
+            cap.release()
+        
+        return cv2.VideoCapture(video_path)
+    
+    def _iter_sampled_frames(
+        self, cap: cv2.VideoCapture, sample_rate: int
+    ) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield (frame_number, frame) for every sample_rate-th frame.
+        Frames are decoded by a reader thread into a bounded queue so decoding
+        overlaps with analysis; skipped frames are only grab()bed, never decoded
+        into BGR.
+        """
+        frames: queue.Queue = queue.Queue(maxsize=self.FRAME_QUEUE_SIZE)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+        
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    frames.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def read_frames():
+            frame_count = 0
+            try:
+                while True:
+                    frame_count += 1
+                    if frame_count % sample_rate != 0:
+                        if not cap.grab():
+                            break
+                        continue
+                    
+                    ret, frame = cap.read()
+                    if not ret or not put((frame_count, frame)):
+                        break
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                put(None)
+        
+        reader = threading.Thread(target=read_frames, name="frame-reader", daemon=True)
+        reader.start()
+        try:
+            while (item := frames.get()) is not None:
+                yield item
+            if errors:
+                raise errors[0]
+        finally:
+            stop.set()
+            reader.join()
+    
     def analyze_video(self, video_path: str, sample_rate: int = 1) -> AnalysisResult:
         """
         Analyze video file for belt width and segments.
@@ -220,7 +572,7 @@ class BeltAnalyzer:
             video_path: Path to video file
             sample_rate: Process every Nth frame
         """
-        cap = cv2.VideoCapture(video_path)
+        cap = self._open_video(video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Cannot open video: {video_path}")
@@ -233,87 +585,164 @@ class BeltAnalyzer:
         
         segments: List[SegmentMeasurement] = []
         current_segment = SegmentMeasurement(segment_id=1, frame_start=0, frame_end=0)
-        alerts: List[dict] = []
+        measured_frames: List[int] = []
+        measured_widths: List[float] = []
         
-        prev_frame = None
-        frame_count = 0
+        prev_gray = None
+        self._consecutive_misses = 0
+        frames = self._iter_sampled_frames(cap, sample_rate)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            if frame_count % sample_rate != 0:
-                continue
-            
-            # Apply ROI if set
-            if self.roi:
-                x, y, w, h = self.roi
-                roi_frame = frame[y:y+h, x:x+w]
-            else:
-                roi_frame = frame
-            
-            # Measure width
-            width = self.measure_width(roi_frame)
-            
-            if width is not None:
-                current_segment.widths.append(width)
-                current_segment.frame_end = frame_count
+        try:
+            for frame_count, frame in frames:
+                # Measure width and check for seam
+                width, is_seam, gray = self._process_frame(self._crop(frame), prev_gray)
                 
-                # Check for anomalies
-                if width < self.min_width_threshold * 1.1:
-                    alerts.append({
-                        "type": "width_warning",
-                        "frame": frame_count,
-                        "message": f"Belt width below threshold: {width:.2f}px",
-                        "severity": "warning"
-                    })
-            
-            # Check for seam
-            if self.detect_seam(roi_frame, prev_frame):
-                # Save current segment
-                if current_segment.widths:
-                    segments.append(current_segment)
+                if width is not None:
+                    current_segment.add_width(width)
+                    current_segment.frame_end = frame_count
+                    measured_frames.append(frame_count)
+                    measured_widths.append(width)
                 
-                # Start new segment
-                current_segment = SegmentMeasurement(
-                    segment_id=len(segments) + 1,
-                    frame_start=frame_count,
-                    frame_end=frame_count
-                )
-                logger.info(f"Seam detected at frame {frame_count}")
-            
-            prev_frame = roi_frame.copy()
+                if is_seam:
+                    # Save current segment
+                    if current_segment.measurement_count:
+                        segments.append(current_segment)
+                    
+                    # Start new segment
+                    current_segment = SegmentMeasurement(
+                        segment_id=len(segments) + 1,
+                        frame_start=frame_count,
+                        frame_end=frame_count
+                    )
+                    logger.info(f"Seam detected at frame {frame_count}")
+                
+                prev_gray = gray
+        finally:
+            frames.close()
+            cap.release()
         
         # Don't forget the last segment
-        if current_segment.widths:
+        if current_segment.measurement_count:
             segments.append(current_segment)
         
-        cap.release()
-        
         # If no seams detected, treat entire video as one segment
         if not segments:
-            segments = [current_segment] if current_segment.widths else []
+            segments = [current_segment] if current_segment.measurement_count else []
         
         logger.info(f"Analysis complete. Found {len(segments)} segments")
+        if self._edge_cache_lookups:
+            logger.info(f"Edge cache hit rate: {self.edge_cache_hit_rate:.0%} "
+                        f"({self._edge_cache_hits}/{self._edge_cache_lookups})")
         
         return AnalysisResult(
             source_file=video_path,
             total_frames=total_frames,
             fps=fps,
             segments=segments,
-            alerts=alerts
+            alerts=self._width_alerts(measured_frames, measured_widths)
         )
     
+    def _width_alerts(self, frames: List[int], widths: List[float]) -> List[dict]:
+        """Build width warnings for measurements close to the minimum threshold"""
+        frames_arr = np.asarray(frames, dtype=np.int64)
+        widths_arr = np.asarray(widths, dtype=np.float64)
+        low = widths_arr < self.min_width_threshold * 1.1
+        
+        return [
+            {
+                "type": "width_warning",
+                "frame": frame,
+                "message": f"Belt width below threshold: {width:.2f}px",
+                "severity": "warning"
+            }
+            for frame, width in zip(frames_arr[low].tolist(), widths_arr[low].tolist())
+        ]
+    
+    def _image_cache_path(self, data: bytes) -> Path:
+        """Cache file for image content analyzed with the current parameters"""
+        content_hash = hashlib.sha256(data).hexdigest()[:16]
+        params = repr((self.IMAGE_CACHE_VERSION, self.min_width_threshold, self.max_width_threshold,
+                       self.seam_detection_threshold, self.calibration, self.roi))
+        params_hash = hashlib.sha256(params.encode()).hexdigest()[:16]
+        return Path(self.cache_dir) / f"{content_hash}_{params_hash}.pkl"
+    
+    def _load_cached_image(self, cache_path: Path) -> Optional[AnalysisResult]:
+        """Cached image result, or None on a miss or an unreadable cache file"""
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache file {cache_path}: {e}")
+            cache_path.unlink(missing_ok=True)
+            return None
+        # Refresh mtime so pruning drops the least recently used files
+        os.utime(cache_path)
+        return cached
+    
+    def _store_cached_image(self, cache_path: Path, result: AnalysisResult) -> None:
+        """Write a result atomically, so concurrent readers never see a partial pickle"""
+        cache_dir = cache_path.parent
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as f:
+            try:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, cache_path)
+        
+        entries = []
+        for path in cache_dir.glob("*.pkl"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                pass
+        if len(entries) > self.IMAGE_CACHE_MAX_FILES:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.IMAGE_CACHE_MAX_FILES]:
+                path.unlink(missing_ok=True)
+    
     def analyze_image(self, image_path: str) -> AnalysisResult:
         """Analyze single image for belt width"""
-        frame = cv2.imread(image_path)
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            raise ValueError(f"Cannot read image: {image_path}")
+        
+        return self.analyze_image_bytes(data, image_path)
+    
+    def analyze_image_bytes(self, data: bytes, source_file: str) -> AnalysisResult:
+        """
+        Analyze an encoded image (e.g. an upload body) decoded from memory.
+        With cache_dir set, results are reused for identical image content
+        and analyzer parameters (e.g. while tuning thresholds).
+        """
+        cache_path = None
+        if self.cache_dir is not None:
+            cache_path = self._image_cache_path(data)
+            cached = self._load_cached_image(cache_path)
+            if cached is not None:
+                return replace(cached, source_file=source_file,
+                               created_at=datetime.now().isoformat())
+        
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
         
         if frame is None:
-            raise ValueError(f"Cannot read image: {image_path}")
+            raise ValueError(f"Cannot read image: {source_file}")
         
+        result = self.analyze_frame(frame, source_file)
+        
+        if cache_path is not None:
+            self._store_cached_image(cache_path, result)
+        
+        return result
+    
+    def analyze_frame(self, frame: np.ndarray, source_file: str = "frame") -> AnalysisResult:
+        """Analyze a single decoded frame for belt width"""
         width = self.measure_width(frame)
         
         segment = SegmentMeasurement(
@@ -332,10 +761,10 @@ class BeltAnalyzer:
             })
         
         return AnalysisResult(
-            source_file=image_path,
+            source_file=source_file,
             total_frames=1,
             fps=0,
-            segments=[segment] if segment.widths else [],
+            segments=[segment] if segment.measurement_count else [],
             alerts=alerts
         )
     
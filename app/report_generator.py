@@ -1,29 +1,167 @@
 """
 Report Generator - Creates Excel, CSV, and JSON reports from analysis results
 """
-import json
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 import logging
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZIP_DEFLATED
 
+import numpy as np
+import orjson
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import LineChart, Reference
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.packaging.relationship import RelationshipList
+from openpyxl.writer.excel import ExcelWriter
 
-from app.belt_analyzer import AnalysisResult, SegmentMeasurement
+from app.belt_analyzer import AnalysisResult, SegmentArrays
 
 logger = logging.getLogger(__name__)
 
+# Buffer size for CSV/JSON report files (fewer, larger write() syscalls)
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# zlib level for the xlsx zip container (6 = zlib/openpyxl default);
+# 1 compresses ~3x faster for a few percent larger files
+EXCEL_COMPRESSION_LEVEL = 6
+
+# Excel styles, shared by all cells instead of created per report/cell
+TITLE_FONT = Font(bold=True, size=14)
+LABEL_FONT = Font(bold=True)
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill("solid", fgColor="2F5496")
+ALERT_FILL = PatternFill("solid", fgColor="FFC7CE")
+GOOD_FILL = PatternFill("solid", fgColor="C6EFCE")
+THIN_SIDE = Side(style='thin')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+CENTER = Alignment(horizontal='center')
+
+# Segment status label and named style, indexed by the alert mask value
+SEGMENT_STATUS = (("OK", "bm_ok"), ("UWAGA", "bm_alert"))
+
+# Worksheet XML pieces for sheets written without openpyxl cell objects
+_SHEET_XML_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    b'<sheetData>'
+)
+_SHEET_XML_TAIL = b'</sheetData></worksheet>'
+_XML_ROW = '<row r="{}">{}</row>'.format
+_XML_NUMBER_CELL = '<c r="{}" s="{}"><v>{}</v></c>'.format
+_XML_STRING_CELL = '<c r="{}" s="{}" t="inlineStr"><is><t>{}</t></is></c>'.format
+
+
+def _named_styles() -> List[NamedStyle]:
+    """
+    Named styles used by the Excel report. Cells reference a style by name,
+    so the style table holds one entry per style instead of per cell.
+    Built per workbook, as a NamedStyle binds to the workbook it is added to.
+    """
+    return [
+        NamedStyle(name="bm_title", font=TITLE_FONT),
+        NamedStyle(name="bm_label", font=LABEL_FONT),
+        NamedStyle(name="bm_header", font=HEADER_FONT, fill=HEADER_FILL,
+                   border=THIN_BORDER, alignment=CENTER),
+        NamedStyle(name="bm_cell", border=THIN_BORDER, alignment=CENTER),
+        NamedStyle(name="bm_ok", fill=GOOD_FILL, border=THIN_BORDER, alignment=CENTER),
+        NamedStyle(name="bm_alert", fill=ALERT_FILL, border=THIN_BORDER, alignment=CENTER),
+        NamedStyle(name="bm_alert_row", border=THIN_BORDER),
+        NamedStyle(name="bm_alert_row_warning", fill=ALERT_FILL, border=THIN_BORDER),
+    ]
+
+
+def _styled_row(ws, values, style: str) -> List[WriteOnlyCell]:
+    """Write-only cells for one row, all referencing the same named style"""
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def _write_json_stream(f, data: dict) -> None:
+    """
+    Write a dict as compact JSON, emitting list values (segments, alerts)
+    item by item so no single buffer holds the whole document.
+    """
+    option = orjson.OPT_SERIALIZE_NUMPY
+    f.write(b"{")
+    for i, (key, value) in enumerate(data.items()):
+        if i:
+            f.write(b",")
+        f.write(orjson.dumps(key))
+        f.write(b":")
+        if isinstance(value, list):
+            f.write(b"[")
+            for j, item in enumerate(value):
+                if j:
+                    f.write(b",")
+                f.write(orjson.dumps(item, option=option))
+            f.write(b"]")
+        else:
+            f.write(orjson.dumps(value, option=option))
+    f.write(b"}")
+
+
+def _style_id(ws, style: str) -> int:
+    """Index of a named style in the workbook's cell style table"""
+    cell = WriteOnlyCell(ws)
+    cell.style = style
+    return cell.style_id
+
+
+def _xml_row(row_idx: int, values, style_id: int) -> str:
+    """One <row> of worksheet XML; columns A, B, C, ... (fewer than 27)"""
+    cells = []
+    for col, value in zip("ABCDEFGHIJKLMNOPQRSTUVWXYZ", values):
+        ref = f"{col}{row_idx}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(_XML_NUMBER_CELL(ref, style_id, value))
+        else:
+            cells.append(_XML_STRING_CELL(ref, style_id, escape(str(value))))
+    return _XML_ROW(row_idx, "".join(cells))
+
+
+class _RawSheetExcelWriter(ExcelWriter):
+    """
+    ExcelWriter that stores prebuilt XML for the given worksheet titles
+    instead of serializing their (empty) openpyxl worksheets.
+    """
+    
+    def __init__(self, workbook, archive, raw_sheets: Dict[str, bytes]):
+        super().__init__(workbook, archive)
+        self.raw_sheets = raw_sheets
+    
+    def write_worksheet(self, ws):
+        xml = self.raw_sheets.get(ws.title)
+        if xml is None:
+            return super().write_worksheet(ws)
+        ws._drawing = SpreadsheetDrawing()
+        ws._rels = RelationshipList()
+        self._archive.writestr(ws.path[1:], xml)
+        self.manifest.append(ws)
+
 
 class ReportGenerator:
     """Generate reports in various formats from belt analysis results"""
     
-    def __init__(self, output_dir: str = "reports"):
+    # Alert count from which the alerts sheet XML is written directly,
+    # bypassing openpyxl's per-cell objects
+    RAW_ALERTS_MIN_ROWS = 5000
+    
+    def __init__(self, output_dir: str = "reports",
+                 excel_compression_level: int = EXCEL_COMPRESSION_LEVEL):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        self.excel_compression_level = excel_compression_level
     
     def generate_all(self, result: AnalysisResult, base_name: Optional[str] = None) -> dict:
         """Generate reports in all formats"""
@@ -31,35 +169,66 @@ class ReportGenerator:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             base_name = f"belt_analysis_{timestamp}"
         
-        paths = {
-            "excel": self.generate_excel(result, f"{base_name}.xlsx"),
-            "csv": self.generate_csv(result, f"{base_name}.csv"),
-            "json": self.generate_json(result, f"{base_name}.json")
-        }
+        # Each format writes its own file from the read-only result, so they
+        # can run concurrently (zlib deflate and file writes release the GIL)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                "excel": executor.submit(self.generate_excel, result, f"{base_name}.xlsx"),
+                "csv": executor.submit(self.generate_csv, result, f"{base_name}.csv"),
+                "json": executor.submit(self.generate_json, result, f"{base_name}.json")
+            }
+            paths = {fmt: future.result() for fmt, future in futures.items()}
         
         logger.info(f"Generated reports: {paths}")
         return paths
     
+    @staticmethod
+    def _segment_rows(arrays: SegmentArrays) -> Iterator[tuple]:
+        """
+        Per-segment table rows (id, start, end, min, max, avg, variance, count)
+        with the width statistics rounded in one NumPy pass
+        """
+        rounded = np.round(
+            np.column_stack((arrays.min_w, arrays.max_w, arrays.avg_w, arrays.var)), 2
+        ).reshape(-1, 4).tolist()
+        for seg_id, start, end, (mn, mx, av, vr), count in zip(
+            arrays.ids.tolist(), arrays.frame_start.tolist(), arrays.frame_end.tolist(),
+            rounded, arrays.count.tolist()
+        ):
+            yield seg_id, start, end, mn, mx, av, vr, count
+    
+    @staticmethod
+    def _segment_alert_mask(arrays: SegmentArrays) -> np.ndarray:
+        """
+        Flag segments with high width variance or a minimum width more than
+        10% below the average width over all measurements.
+        """
+        min_widths, avg_widths, variances, counts = arrays.min_w, arrays.avg_w, arrays.var, arrays.count
+        
+        high_variance = variances > 100
+        if high_variance.all():
+            # Every segment is already flagged, the global average can't change that
+            return high_variance
+        
+        # Average over all measurements = count-weighted mean of segment averages
+        total = counts.sum()
+        global_avg = float(avg_widths @ counts / total) if total else 0.0
+        
+        return high_variance | (min_widths < global_avg * 0.9)
+    
     def generate_excel(self, result: AnalysisResult, filename: str) -> str:
         """Generate detailed Excel report with formatting and charts"""
         filepath = self.output_dir / filename
-        wb = Workbook()
-        
-        # Styles
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill("solid", fgColor="2F5496")
-        alert_fill = PatternFill("solid", fgColor="FFC7CE")
-        good_fill = PatternFill("solid", fgColor="C6EFCE")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        arrays = result.segment_arrays
+        
+        # Write-only workbook streams rows to disk instead of keeping every
+        # cell in memory; rows must be appended in order
+        wb = Workbook(write_only=True)
+        for style in _named_styles():
+            wb.add_named_style(style)
         
         # Summary Sheet
-        ws_summary = wb.active
-        ws_summary.title = "Podsumowanie"
+        ws_summary = wb.create_sheet("Podsumowanie")
         
         summary_data = [
             ["Raport Analizy Taśmy Przenośnika", ""],
@@ -68,17 +237,14 @@ class ReportGenerator:
             ["Data analizy:", datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
             ["Całkowita liczba klatek:", result.total_frames],
             ["FPS:", result.fps],
-            ["Liczba wykrytych segmentów:", len(result.segments)],
+            ["Liczba wykrytych segmentów:", len(arrays)],
             ["Liczba alertów:", len(result.alerts)],
         ]
         
-        for row_idx, row in enumerate(summary_data, 1):
-            for col_idx, value in enumerate(row, 1):
-                cell = ws_summary.cell(row=row_idx, column=col_idx, value=value)
-                if row_idx == 1:
-                    cell.font = Font(bold=True, size=14)
-                elif col_idx == 1:
-                    cell.font = Font(bold=True)
+        title, *rows = summary_data
+        ws_summary.append(_styled_row(ws_summary, title, "bm_title"))
+        for label, value in rows:
+            ws_summary.append(_styled_row(ws_summary, (label,), "bm_label") + [value])
         
         # Segments Sheet
         ws_segments = wb.create_sheet("Segmenty")
@@ -89,109 +255,98 @@ class ReportGenerator:
             "Śr. Szerokość (px)", "Wariancja", "Liczba Pomiarów", "Status"
         ]
         
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws_segments.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = border
-        
-        # Calculate average width across all segments for comparison
-        all_widths = [w for s in result.segments for w in s.widths]
-        global_avg = sum(all_widths) / len(all_widths) if all_widths else 0
-        
-        for row_idx, segment in enumerate(result.segments, 2):
-            # Determine status based on width variance
-            status = "OK"
-            fill = good_fill
-            if segment.width_variance > 100:
-                status = "UWAGA"
-                fill = alert_fill
-            elif segment.min_width < global_avg * 0.9:
-                status = "UWAGA"
-                fill = alert_fill
-            
-            row_data = [
-                segment.segment_id,
-                segment.frame_start,
-                segment.frame_end,
-                round(segment.min_width, 2),
-                round(segment.max_width, 2),
-                round(segment.avg_width, 2),
-                round(segment.width_variance, 2),
-                len(segment.widths),
-                status
-            ]
-            
-            for col_idx, value in enumerate(row_data, 1):
-                cell = ws_segments.cell(row=row_idx, column=col_idx, value=value)
-                cell.border = border
-                cell.alignment = Alignment(horizontal='center')
-                if col_idx == 9:  # Status column
-                    cell.fill = fill
-        
-        # Auto-width columns
+        # Column widths have to be set before any rows are written
         for col_idx, _ in enumerate(headers, 1):
             ws_segments.column_dimensions[get_column_letter(col_idx)].width = 18
         
+        ws_segments.append(_styled_row(ws_segments, headers, "bm_header"))
+        
+        alert_mask = self._segment_alert_mask(arrays).tolist()
+        
+        for row_data, is_alert in zip(self._segment_rows(arrays), alert_mask):
+            status, status_style = SEGMENT_STATUS[is_alert]
+            ws_segments.append(
+                _styled_row(ws_segments, row_data, "bm_cell")
+                + _styled_row(ws_segments, (status,), status_style)
+            )
+        
         # Alerts Sheet
         ws_alerts = wb.create_sheet("Alerty")
         alert_headers = ["Typ", "Klatka", "Wiadomość", "Poziom"]
         
-        for col_idx, header in enumerate(alert_headers, 1):
-            cell = ws_alerts.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
+        raw_sheets = {}
         
-        for row_idx, alert in enumerate(result.alerts, 2):
-            row_data = [
-                alert.get("type", ""),
-                alert.get("frame", ""),
-                alert.get("message", ""),
-                alert.get("severity", "")
-            ]
-            for col_idx, value in enumerate(row_data, 1):
-                cell = ws_alerts.cell(row=row_idx, column=col_idx, value=value)
-                cell.border = border
-                if alert.get("severity") == "warning":
-                    cell.fill = alert_fill
+        if len(result.alerts) >= self.RAW_ALERTS_MIN_ROWS:
+            raw_sheets[ws_alerts.title] = self._alerts_sheet_xml(ws_alerts, alert_headers, result.alerts)
+        else:
+            ws_alerts.append(_styled_row(ws_alerts, alert_headers, "bm_header"))
+            
+            for alert in result.alerts:
+                row_data = [
+                    alert.get("type", ""),
+                    alert.get("frame", ""),
+                    alert.get("message", ""),
+                    alert.get("severity", "")
+                ]
+                style = "bm_alert_row_warning" if alert.get("severity") == "warning" else "bm_alert_row"
+                ws_alerts.append(_styled_row(ws_alerts, row_data, style))
         
         # Width Chart (if enough data)
-        if len(result.segments) >= 2:
+        if len(arrays) >= 2:
             ws_chart = wb.create_sheet("Wykres")
-            ws_chart['A1'] = "Segment"
-            ws_chart['B1'] = "Min"
-            ws_chart['C1'] = "Max"
-            ws_chart['D1'] = "Średnia"
+            ws_chart.append(("Segment", "Min", "Max", "Średnia"))
             
-            for i, seg in enumerate(result.segments, 2):
-                ws_chart[f'A{i}'] = seg.segment_id
-                ws_chart[f'B{i}'] = seg.min_width
-                ws_chart[f'C{i}'] = seg.max_width
-                ws_chart[f'D{i}'] = seg.avg_width
+            # Plain tuples through append: no A1 lookups or per-cell objects
+            for row in zip(arrays.ids.tolist(), arrays.min_w.tolist(),
+                           arrays.max_w.tolist(), arrays.avg_w.tolist()):
+                ws_chart.append(row)
+            last_row = len(arrays) + 1
             
             chart = LineChart()
             chart.title = "Szerokość Taśmy per Segment"
             chart.y_axis.title = "Szerokość (px)"
             chart.x_axis.title = "Segment"
             
-            data = Reference(ws_chart, min_col=2, max_col=4, min_row=1, max_row=len(result.segments)+1)
-            cats = Reference(ws_chart, min_col=1, min_row=2, max_row=len(result.segments)+1)
+            data = Reference(ws_chart, min_col=2, max_col=4, min_row=1, max_row=last_row)
+            cats = Reference(ws_chart, min_col=1, min_row=2, max_row=last_row)
             chart.add_data(data, titles_from_data=True)
             chart.set_categories(cats)
             
             ws_chart.add_chart(chart, "F2")
         
-        wb.save(filepath)
+        # Same as wb.save(), but with a configurable deflate level
+        wb.properties.modified = datetime.utcnow()
+        archive = ZipFile(filepath, 'w', ZIP_DEFLATED, allowZip64=True,
+                          compresslevel=self.excel_compression_level)
+        _RawSheetExcelWriter(wb, archive, raw_sheets).save()
         logger.info(f"Excel report saved: {filepath}")
         return str(filepath)
     
+    @staticmethod
+    def _alerts_sheet_xml(ws, headers: List[str], alerts: List[dict]) -> bytes:
+        """Worksheet XML for the alerts sheet, styled like the openpyxl path"""
+        header_style = _style_id(ws, "bm_header")
+        warning_style = _style_id(ws, "bm_alert_row_warning")
+        row_style = _style_id(ws, "bm_alert_row")
+        
+        rows = [_xml_row(1, headers, header_style)]
+        for row_idx, alert in enumerate(alerts, 2):
+            row_data = (
+                alert.get("type", ""),
+                alert.get("frame", ""),
+                alert.get("message", ""),
+                alert.get("severity", "")
+            )
+            style = warning_style if alert.get("severity") == "warning" else row_style
+            rows.append(_xml_row(row_idx, row_data, style))
+        
+        return _SHEET_XML_HEAD + "".join(rows).encode("utf-8") + _SHEET_XML_TAIL
+    
     def generate_csv(self, result: AnalysisResult, filename: str) -> str:
         """Generate CSV report"""
         filepath = self.output_dir / filename
         
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
+        with open(filepath, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
             writer = csv.writer(f)
             
             # Headers
@@ -201,31 +356,25 @@ class ReportGenerator:
                 "variance", "measurement_count"
             ])
             
-            # Data
-            for segment in result.segments:
-                writer.writerow([
-                    segment.segment_id,
-                    segment.frame_start,
-                    segment.frame_end,
-                    round(segment.min_width, 2),
-                    round(segment.max_width, 2),
-                    round(segment.avg_width, 2),
-                    round(segment.width_variance, 2),
-                    len(segment.widths)
-                ])
+            # Generator lets the C writer pull rows without an intermediate list
+            writer.writerows(self._segment_rows(result.segment_arrays))
         
         logger.info(f"CSV report saved: {filepath}")
         return str(filepath)
     
-    def generate_json(self, result: AnalysisResult, filename: str) -> str:
-        """Generate JSON report"""
+    def generate_json(self, result: AnalysisResult, filename: str, pretty: bool = False) -> str:
+        """Generate JSON report (compact and streamed unless pretty is set)"""
         filepath = self.output_dir / filename
         
         data = result.to_dict()
         data["generated_at"] = datetime.now().isoformat()
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # orjson writes UTF-8 bytes directly (non-ASCII kept, as ensure_ascii=False did)
+        with open(filepath, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            if pretty:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                _write_json_stream(f, data)
         
         logger.info(f"JSON report saved: {filepath}")
         return str(filepath)
@@ -0,0 +1,12 @@
+"""
+Video analysis entry point for the API's worker processes.
+Workers are spawned and import this module, so it must stay free of
+import-time side effects (no app, directories or result store).
+"""
+from app.belt_analyzer import BeltAnalyzer, AnalysisResult
+
+
+def run_video_analysis(video_path: str, analyzer_config: dict, sample_rate: int) -> AnalysisResult:
+    """Analyze video in a worker process (top-level so it can be pickled)"""
+    analyzer = BeltAnalyzer(**analyzer_config)
+    return analyzer.analyze_video(video_path, sample_rate=sample_rate)
@@ -5,8 +5,6 @@ from reportlab.lib.colors import HexColor
 from reportlab.pdfgen import canvas
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.platypus import Paragraph
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 
 WIDTH, HEIGHT = landscape(A4)
 BG_COLOR = HexColor("#1a1a1a")
@@ -101,32 +99,30 @@ def slide_solution(c):
         ("06", "DOCKER", "Konteneryzacja", False),
     ]
     
+    tiles = []
     for i, (num, title, desc, highlight) in enumerate(boxes):
         row, col = divmod(i, 3)
-        x = 30 + col * 270
-        y = HEIGHT - 200 - row * 140
-        
-        if highlight:
-            c.setFillColor(GOLD)
-        else:
-            c.setFillColor(DARK_GRAY)
-        c.roundRect(x, y, 250, 110, 8, fill=1, stroke=0)
-        
-        if not highlight:
-            c.setStrokeColor(GOLD)
-            c.roundRect(x, y, 250, 110, 8, fill=0, stroke=1)
-        
-        text_color = BG_COLOR if highlight else GOLD
-        c.setFillColor(text_color)
-        c.setFont("Helvetica-Bold", 28)
+        tiles.append((30 + col * 270, HEIGHT - 200 - row * 140, num, title, desc, highlight))
+    
+    # Group drawing by canvas state: one fill/font change per batch, not per tile
+    c.setStrokeColor(GOLD)
+    for x, y, _, _, _, highlight in tiles:
+        c.setFillColor(GOLD if highlight else DARK_GRAY)
+        c.roundRect(x, y, 250, 110, 8, fill=1, stroke=0 if highlight else 1)
+    
+    c.setFont("Helvetica-Bold", 28)
+    for x, y, num, _, _, highlight in tiles:
+        c.setFillColor(BG_COLOR if highlight else GOLD)
         c.drawString(x + 15, y + 70, num)
-        
+    
+    c.setFont("Helvetica-Bold", 13)
+    for x, y, _, title, _, highlight in tiles:
         c.setFillColor(BG_COLOR if highlight else WHITE)
-        c.setFont("Helvetica-Bold", 13)
         c.drawString(x + 15, y + 40, title)
-        
+    
+    c.setFont("Helvetica", 10)
+    for x, y, _, _, desc, highlight in tiles:
         c.setFillColor(HexColor("#333") if highlight else GRAY)
-        c.setFont("Helvetica", 10)
         c.drawString(x + 15, y + 20, desc)
 
 def slide_api(c):
@@ -144,23 +140,27 @@ def slide_api(c):
         ("GET", "/api/v1/reports/{id}/csv", "Raport CSV", "#2196F3"),
     ]
     
-    for i, (method, path, desc, color) in enumerate(endpoints):
-        y = HEIGHT - 140 - i * 60
-        c.setFillColor(DARK_GRAY)
+    rows = [(HEIGHT - 140 - i * 60, method, path, desc, HexColor(color))
+            for i, (method, path, desc, color) in enumerate(endpoints)]
+    
+    c.setFillColor(DARK_GRAY)
+    for y, _, _, _, _ in rows:
         c.roundRect(30, y - 30, 400, 50, 6, fill=1, stroke=0)
-        c.setFillColor(HexColor(color))
+    
+    c.setFont("Helvetica-Bold", 10)
+    for y, method, _, _, color in rows:
+        c.setFillColor(color)
         c.rect(30, y - 30, 3, 50, fill=1, stroke=0)
-        
-        c.setFillColor(HexColor(color))
-        c.setFont("Helvetica-Bold", 10)
         c.drawString(45, y, method)
-        
-        c.setFillColor(GOLD)
-        c.setFont("Courier", 11)
+    
+    c.setFillColor(GOLD)
+    c.setFont("Courier", 11)
+    for y, _, path, _, _ in rows:
         c.drawString(95, y, path)
-        
-        c.setFillColor(GRAY)
-        c.setFont("Helvetica", 10)
+    
+    c.setFillColor(GRAY)
+    c.setFont("Helvetica", 10)
+    for y, _, _, desc, _ in rows:
         c.drawString(45, y - 18, desc)
     
     # Response example
@@ -196,14 +196,17 @@ def slide_tech(c):
     c.drawString(30, HEIGHT - 110, "100% OPEN SOURCE")
     
     techs = ["Python 3.11", "OpenCV", "FastAPI", "NumPy", "Docker", "openpyxl"]
+    tiles = []
     for i, tech in enumerate(techs):
         row, col = divmod(i, 3)
-        x = 30 + col * 140
-        y = HEIGHT - 170 - row * 50
-        c.setFillColor(DARK_GRAY)
+        tiles.append((30 + col * 140, HEIGHT - 170 - row * 50, tech))
+    
+    c.setFillColor(DARK_GRAY)
+    for x, y, _ in tiles:
         c.roundRect(x, y, 130, 40, 6, fill=1, stroke=0)
-        c.setFillColor(GOLD)
-        c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(GOLD)
+    c.setFont("Helvetica-Bold", 12)
+    for x, y, tech in tiles:
         c.drawCentredString(x + 65, y + 14, tech)
     
     # Requirements checklist
@@ -240,31 +243,28 @@ def slide_benefits(c):
         ("↑", "PREDYKCJA AWARII", "Analiza trendów", False),
     ]
     
-    for i, (value, title, desc, highlight) in enumerate(metrics):
-        x = 30 + i * 270
-        y = HEIGHT - 320
-        
-        if highlight:
-            c.setFillColor(GOLD)
-        else:
-            c.setFillColor(DARK_GRAY)
-        c.roundRect(x, y, 250, 200, 12, fill=1, stroke=0)
-        
-        if not highlight:
-            c.setStrokeColor(GOLD)
-            c.setLineWidth(2)
-            c.roundRect(x, y, 250, 200, 12, fill=0, stroke=1)
-        
+    tiles = [(30 + i * 270, HEIGHT - 320, value, title, desc, highlight)
+             for i, (value, title, desc, highlight) in enumerate(metrics)]
+    
+    c.setStrokeColor(GOLD)
+    c.setLineWidth(2)
+    for x, y, _, _, _, highlight in tiles:
+        c.setFillColor(GOLD if highlight else DARK_GRAY)
+        c.roundRect(x, y, 250, 200, 12, fill=1, stroke=0 if highlight else 1)
+    
+    c.setFont("Helvetica-Bold", 48)
+    for x, y, value, _, _, highlight in tiles:
         c.setFillColor(BG_COLOR if highlight else GOLD)
-        c.setFont("Helvetica-Bold", 48)
         c.drawCentredString(x + 125, y + 130, value)
-        
+    
+    c.setFont("Helvetica-Bold", 14)
+    for x, y, _, title, _, highlight in tiles:
         c.setFillColor(HexColor("#333") if highlight else WHITE)
-        c.setFont("Helvetica-Bold", 14)
         c.drawCentredString(x + 125, y + 80, title)
-        
+    
+    c.setFont("Helvetica", 11)
+    for x, y, _, _, desc, highlight in tiles:
         c.setFillColor(HexColor("#444") if highlight else GRAY)
-        c.setFont("Helvetica", 11)
         c.drawCentredString(x + 125, y + 55, desc)
 
 def slide_end(c):
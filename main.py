@@ -11,6 +11,9 @@ from pathlib import Path
 from app.belt_analyzer import BeltAnalyzer
 from app.report_generator import ReportGenerator
 
+# Suffixes analyzed as still images; everything else is treated as video
+_IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.bmp'})
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -25,6 +28,7 @@ def main():
     parser.add_argument("--roi", nargs=4, type=int, metavar=('X', 'Y', 'W', 'H'), help="Region of interest")
     parser.add_argument("--format", choices=["all", "excel", "csv", "json"], default="all", help="Output format")
     parser.add_argument("--json-stdout", action="store_true", help="Output JSON to stdout")
+    parser.add_argument("--cuda", action="store_true", help="Run seam detection on GPU (if available)")
     
     args = parser.parse_args()
     
@@ -39,13 +43,14 @@ def main():
         min_width_threshold=args.min_width,
         max_width_threshold=args.max_width,
         seam_detection_threshold=args.seam_threshold,
-        roi=roi
+        roi=roi,
+        use_cuda=args.cuda
     )
     
     # Run analysis
     print(f"Analyzing: {input_path}")
     
-    if input_path.suffix.lower() in {'.jpg', '.jpeg', '.png', '.bmp'}:
+    if input_path.suffix.lower() in _IMAGE_EXTS:
         result = analyzer.analyze_image(str(input_path))
     else:
         result = analyzer.analyze_video(str(input_path), sample_rate=args.sample_rate)
@@ -1,4 +1,5 @@
 """Tests for Belt Analyzer"""
+import pickle
 import pytest
 import numpy as np
 import cv2
@@ -22,6 +23,26 @@ class TestSegmentMeasurement:
         assert seg.min_width == 100.0
         assert seg.max_width == 200.0
         assert seg.avg_width == 150.0
+    
+    def test_add_width(self):
+        seg = SegmentMeasurement(segment_id=1, frame_start=0, frame_end=0)
+        widths = [float(w) for w in range(100, 3100)]
+        for w in widths:
+            seg.add_width(w)
+        assert seg.measurement_count == len(widths)
+        assert list(seg.widths) == widths
+        assert seg.min_width == 100.0
+        assert seg.max_width == 3099.0
+        assert seg.avg_width == pytest.approx(np.mean(widths))
+        assert seg.width_variance == pytest.approx(np.var(widths))
+    
+    def test_pickle_keeps_only_recorded_widths(self):
+        seg = SegmentMeasurement(segment_id=1, frame_start=0, frame_end=10, widths=[100.0, 200.0])
+        restored = pickle.loads(pickle.dumps(seg))
+        assert len(restored._widths) == 2
+        assert restored.avg_width == 150.0
+        restored.add_width(300.0)
+        assert list(restored.widths) == [100.0, 200.0, 300.0]
 
 
 class TestBeltAnalyzer:
@@ -56,6 +77,87 @@ class TestBeltAnalyzer:
         assert left is not None
         assert right is not None
         assert left < right
+
+    def test_detect_edges_empty(self, analyzer):
+        binary = np.zeros((480, 640), dtype=np.uint8)
+        assert analyzer.detect_belt_edges(binary) == (None, None)
+
+    def test_detect_seam_identical_frames(self, analyzer, test_frame):
+        gray = cv2.cvtColor(test_frame, cv2.COLOR_BGR2GRAY)
+        assert analyzer.detect_seam(gray, None) is False
+        assert analyzer.detect_seam(gray, gray.copy()) is False
+    
+    def test_detect_seam_horizontal_line(self, analyzer):
+        prev = np.full((480, 640), 128, dtype=np.uint8)
+        curr = prev.copy()
+        cv2.line(curr, (0, 240), (639, 240), 0, 4)
+        assert analyzer.detect_seam(curr, prev) is True
+        assert analyzer.detect_seam(curr, prev, check_lines=False) is False
+    
+    def test_analyze_video(self, analyzer, test_frame, tmp_path):
+        video_path = str(tmp_path / "belt.avi")
+        writer = cv2.VideoWriter(
+            video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10.0,
+            (test_frame.shape[1], test_frame.shape[0])
+        )
+        for _ in range(10):
+            writer.write(test_frame)
+        writer.release()
+        
+        result = analyzer.analyze_video(video_path)
+        assert result.total_frames == 10
+        assert len(result.segments) == 1
+        assert len(result.segments[0].widths) == 10
+        assert 50 < result.segments[0].avg_width < 500
+        
+        sampled = analyzer.analyze_video(video_path, sample_rate=3)
+        assert sampled.segments[0].measurement_count == 3
+        assert sampled.segments[0].frame_end == 9
+    
+    def test_edge_cache(self, test_frame):
+        analyzer = BeltAnalyzer(min_width_threshold=50, max_width_threshold=500, edge_cache_size=8)
+        width = analyzer.measure_width(test_frame)
+        gray = cv2.cvtColor(test_frame, cv2.COLOR_BGR2GRAY)
+        cached = [analyzer._width_from_gray(gray) for _ in range(3)]
+        assert cached == [width] * 3
+        assert analyzer.edge_cache_hit_rate == pytest.approx(2 / 3)
+    
+    def test_analyze_image_cache(self, test_frame, tmp_path):
+        image_path = str(tmp_path / "belt.png")
+        cv2.imwrite(image_path, test_frame)
+        analyzer = BeltAnalyzer(min_width_threshold=50, max_width_threshold=500,
+                                cache_dir=str(tmp_path / "cache"))
+        
+        first = analyzer.analyze_image(image_path)
+        assert len(list((tmp_path / "cache").glob("*.pkl"))) == 1
+        second = analyzer.analyze_image(image_path)
+        assert second.segments[0].avg_width == first.segments[0].avg_width
+        
+        analyzer.min_width_threshold = 60
+        analyzer.analyze_image(image_path)
+        assert len(list((tmp_path / "cache").glob("*.pkl"))) == 2
+        
+        analyzer.IMAGE_CACHE_VERSION += 1
+        analyzer.analyze_image(image_path)
+        assert len(list((tmp_path / "cache").glob("*.pkl"))) == 3
+    
+    def test_analyze_image_cache_recovers(self, test_frame, tmp_path, monkeypatch):
+        image_path = str(tmp_path / "belt.png")
+        cv2.imwrite(image_path, test_frame)
+        cache_dir = tmp_path / "cache"
+        analyzer = BeltAnalyzer(min_width_threshold=50, max_width_threshold=500,
+                                cache_dir=str(cache_dir))
+        
+        first = analyzer.analyze_image(image_path)
+        (cache_path,) = cache_dir.glob("*.pkl")
+        cache_path.write_bytes(b"truncated")
+        second = analyzer.analyze_image(image_path)
+        assert second.segments[0].avg_width == first.segments[0].avg_width
+        
+        monkeypatch.setattr(BeltAnalyzer, "IMAGE_CACHE_MAX_FILES", 1)
+        analyzer.min_width_threshold = 60
+        analyzer.analyze_image(image_path)
+        assert len(list(cache_dir.glob("*"))) == 1
     
     def test_visualization(self, analyzer, test_frame):
         vis = analyzer.get_visualization(test_frame)
@@ -81,3 +183,17 @@ class TestAnalysisResult:
         assert d["source_file"] == "test.mp4"
         assert d["total_segments"] == 1
         assert len(d["segments"]) == 1
+    
+    def test_segment_arrays(self):
+        segments = [
+            SegmentMeasurement(segment_id=1, frame_start=0, frame_end=10, widths=[100.0, 200.0]),
+            SegmentMeasurement(segment_id=2, frame_start=10, frame_end=20, widths=[300.0])
+        ]
+        result = AnalysisResult(source_file="test.mp4", total_frames=20, fps=30.0, segments=segments)
+        arrays = result.segment_arrays
+        assert len(arrays) == 2
+        assert arrays.ids.tolist() == [1, 2]
+        assert arrays.avg_w.tolist() == [150.0, 300.0]
+        assert arrays.var.tolist() == [2500.0, 0.0]
+        assert arrays.count.tolist() == [2, 1]
+        assert result.segment_arrays is arrays
@@ -1,12 +1,28 @@
 """Tests for Belt Monitor API"""
+import os
 import pytest
+import numpy as np
+import cv2
+from concurrent.futures.process import BrokenProcessPool
 from fastapi.testclient import TestClient
-from app.api import app
+from app import api
+from app.api import app, ResultStore, REPORT_CACHE
+from app.belt_analyzer import AnalysisResult, SegmentMeasurement
 
 
-@pytest.fixture
-def client():
-    return TestClient(app)
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # One client per module; the context runs app startup/shutdown once.
+    # Uploads, cached image results and spilled results go to a temporary
+    # directory, so images are really analyzed and data/ is left alone
+    data_dir = tmp_path_factory.mktemp("data")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(api, "UPLOAD_DIR", data_dir / "uploads")
+        mp.setattr(api, "IMAGE_CACHE_DIR", data_dir / "cache")
+        mp.setattr(api, "analysis_results", ResultStore(maxsize=128, spill_dir=data_dir / "results"))
+        (data_dir / "uploads").mkdir()
+        with TestClient(app) as test_client:
+            yield test_client
 
 
 class TestHealthEndpoint:
@@ -27,6 +43,112 @@ class TestRootEndpoint:
         assert "endpoints" in data
 
 
+@pytest.fixture
+def belt_png():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (150, 0), (490, 480), (255, 255, 255), -1)
+    ok, encoded = cv2.imencode(".png", frame)
+    assert ok
+    return encoded.tobytes()
+
+
+class TestAnalyzeEndpoint:
+    def test_analyze_image(self, client, belt_png):
+        response = client.post(
+            "/api/v1/analyze",
+            files={"file": ("belt.png", belt_png, "image/png")},
+            params={"min_width_threshold": 50, "max_width_threshold": 500}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_segments"] == 1
+        assert data["segments"][0]["measurement_count"] == 1
+        
+        response = client.get(f"/api/v1/results/{data['analysis_id']}")
+        assert response.status_code == 200
+    
+    def test_analyze_video(self, client, tmp_path):
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.rectangle(frame, (150, 0), (490, 480), (255, 255, 255), -1)
+        video_path = tmp_path / "belt.avi"
+        writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (640, 480))
+        for _ in range(5):
+            writer.write(frame)
+        writer.release()
+        
+        response = client.post(
+            "/api/v1/analyze",
+            files={"file": ("belt.avi", video_path.read_bytes(), "video/x-msvideo")},
+            params={"min_width_threshold": 50, "max_width_threshold": 500}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_frames"] == 5
+        assert data["segments"][0]["measurement_count"] == 5
+    
+    def test_analyze_video_after_worker_died(self, client, tmp_path):
+        # A worker exiting abruptly breaks the pool; the next request recreates it
+        broken = api._get_video_executor()
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        self.test_analyze_video(client, tmp_path)
+        assert api._video_executor is not broken
+    
+    def test_spilled_result_survives_video_worker(self, client, belt_png, tmp_path, monkeypatch):
+        # Fresh workers are spawned with tmp_path as their working directory,
+        # where data/results is this store's spill directory
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(api, "analysis_results", ResultStore(maxsize=1, spill_dir=tmp_path / "data" / "results"))
+        monkeypatch.setattr(api, "_video_executor", None)
+        
+        spilled_id = None
+        for _ in range(2):
+            response = client.post(
+                "/api/v1/analyze",
+                files={"file": ("belt.png", belt_png, "image/png")},
+                params={"min_width_threshold": 50, "max_width_threshold": 500}
+            )
+            spilled_id = spilled_id or response.json()["analysis_id"]
+        assert (tmp_path / "data" / "results" / f"{spilled_id}.pkl").exists()
+        
+        try:
+            self.test_analyze_video(client, tmp_path)
+        finally:
+            api._video_executor.shutdown()
+        
+        assert client.get(f"/api/v1/results/{spilled_id}").status_code == 200
+        assert client.get(f"/api/v1/reports/{spilled_id}/csv").status_code == 200
+    
+    def test_reports_cached_until_delete(self, client, belt_png):
+        response = client.post(
+            "/api/v1/analyze",
+            files={"file": ("belt.png", belt_png, "image/png")},
+            params={"min_width_threshold": 50, "max_width_threshold": 500}
+        )
+        analysis_id = response.json()["analysis_id"]
+        
+        first = client.get(f"/api/v1/reports/{analysis_id}/csv")
+        assert first.status_code == 200
+        report_path = REPORT_CACHE[(analysis_id, "csv")]
+        mtime = os.path.getmtime(report_path)
+        
+        second = client.get(f"/api/v1/reports/{analysis_id}/csv")
+        assert second.content == first.content
+        assert os.path.getmtime(report_path) == mtime
+        
+        assert client.get(f"/api/v1/reports/{analysis_id}/json").status_code == 200
+        assert client.delete(f"/api/v1/results/{analysis_id}").status_code == 200
+        assert (analysis_id, "csv") not in REPORT_CACHE
+        assert not os.path.exists(report_path)
+    
+    def test_unsupported_file_type(self, client):
+        response = client.post(
+            "/api/v1/analyze",
+            files={"file": ("notes.txt", b"hello", "text/plain")}
+        )
+        assert response.status_code == 400
+
+
 class TestResultsEndpoint:
     def test_list_empty_results(self, client):
         response = client.get("/api/v1/results")
@@ -37,3 +159,77 @@ class TestResultsEndpoint:
     def test_get_nonexistent_result(self, client):
         response = client.get("/api/v1/results/nonexistent")
         assert response.status_code == 404
+    
+    def test_lost_spill_is_not_found(self, client, belt_png, tmp_path, monkeypatch):
+        monkeypatch.setattr(api, "analysis_results", ResultStore(maxsize=1, spill_dir=tmp_path))
+        ids = [
+            client.post(
+                "/api/v1/analyze",
+                files={"file": ("belt.png", belt_png, "image/png")},
+                params={"min_width_threshold": 50, "max_width_threshold": 500}
+            ).json()["analysis_id"]
+            for _ in range(2)
+        ]
+        (tmp_path / f"{ids[0]}.pkl").write_bytes(b"truncated")
+        
+        assert client.get(f"/api/v1/results/{ids[0]}").status_code == 404
+        assert client.get(f"/api/v1/reports/{ids[0]}/csv").status_code == 404
+        listed = [a["analysis_id"] for a in client.get("/api/v1/results").json()["analyses"]]
+        assert listed == [ids[1]]
+
+
+class TestResultStore:
+    @staticmethod
+    def make_result(name):
+        seg = SegmentMeasurement(segment_id=1, frame_start=0, frame_end=1, widths=[100.0, 120.0])
+        return AnalysisResult(source_file=name, total_frames=1, fps=30.0, segments=[seg])
+    
+    def test_eviction_spills_to_disk(self, tmp_path):
+        store = ResultStore(maxsize=2, spill_dir=tmp_path)
+        for aid in ("a", "b", "c"):
+            store[aid] = self.make_result(aid)
+        
+        assert (tmp_path / "a.pkl").exists()
+        assert "a" in store
+        restored = store["a"]
+        assert restored.source_file == "a"
+        assert restored.segments[0].avg_width == 110.0
+        assert sorted(aid for aid, _ in store.summaries()) == ["a", "b", "c"]
+    
+    def test_summaries_and_spill_limit(self, tmp_path):
+        store = ResultStore(maxsize=1, spill_dir=tmp_path, max_spilled=1)
+        for aid in ("a", "b", "c"):
+            store[aid] = self.make_result(aid)
+        
+        assert not (tmp_path / "a.pkl").exists()
+        assert "a" not in store
+        summaries = dict(store.summaries())
+        assert sorted(summaries) == ["b", "c"]
+        assert summaries["b"]["source_file"] == "b"
+        assert summaries["b"]["total_segments"] == 1
+    
+    def test_stale_spills_removed_explicitly(self, tmp_path):
+        (tmp_path / "old.pkl").write_bytes(b"stale")
+        store = ResultStore(maxsize=1, spill_dir=tmp_path)
+        assert (tmp_path / "old.pkl").exists()
+        store["a"] = self.make_result("a")
+        store["b"] = self.make_result("b")
+        store.remove_stale_spills()
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a.pkl"]
+        
+        (tmp_path / "a.pkl").unlink()
+        with pytest.raises(KeyError):
+            store["a"]
+        assert "a" not in store
+        assert [aid for aid, _ in store.summaries()] == ["b"]
+    
+    def test_delete(self, tmp_path):
+        store = ResultStore(maxsize=1, spill_dir=tmp_path)
+        store["a"] = self.make_result("a")
+        store["b"] = self.make_result("b")
+        del store["a"]
+        del store["b"]
+        assert "a" not in store
+        assert "b" not in store
+        with pytest.raises(KeyError):
+            del store["a"]
@@ -0,0 +1,97 @@
+"""Tests for Report Generator"""
+import csv
+import json
+import pytest
+from openpyxl import load_workbook
+from app.belt_analyzer import SegmentMeasurement, AnalysisResult
+from app.report_generator import ReportGenerator
+
+
+@pytest.fixture
+def result():
+    segments = [
+        SegmentMeasurement(segment_id=1, frame_start=0, frame_end=10, widths=[300.0, 302.0, 301.0]),
+        SegmentMeasurement(segment_id=2, frame_start=10, frame_end=20, widths=[250.0, 300.0]),
+        SegmentMeasurement(segment_id=3, frame_start=20, frame_end=30, widths=[299.0, 301.0])
+    ]
+    alerts = [{
+        "type": "width_warning",
+        "frame": 12,
+        "message": "Belt width below threshold: 250.00px",
+        "severity": "warning"
+    }]
+    return AnalysisResult(source_file="belt.mp4", total_frames=30, fps=10.0,
+                          segments=segments, alerts=alerts)
+
+
+@pytest.fixture
+def generator(tmp_path):
+    return ReportGenerator(str(tmp_path))
+
+
+class TestExcelReport:
+    def test_sheets(self, generator, result):
+        wb = load_workbook(generator.generate_excel(result, "report.xlsx"))
+        assert wb.sheetnames == ["Podsumowanie", "Segmenty", "Alerty", "Wykres"]
+        assert wb["Podsumowanie"]["B3"].value == "belt.mp4"
+        assert len(wb["Wykres"]._charts) == 1
+
+    def test_segment_rows(self, generator, result):
+        ws = load_workbook(generator.generate_excel(result, "report.xlsx"))["Segmenty"]
+        rows = list(ws.iter_rows(min_row=2, values_only=True))
+        assert len(rows) == 3
+        assert rows[0][:3] == (1, 0, 10)
+        assert rows[0][3] == 300.0
+        assert [row[8] for row in rows] == ["OK", "UWAGA", "OK"]
+        assert ws["I3"].fill.fgColor.rgb.endswith("FFC7CE")
+
+    def test_alert_rows(self, generator, result):
+        ws = load_workbook(generator.generate_excel(result, "report.xlsx"))["Alerty"]
+        rows = list(ws.iter_rows(values_only=True))
+        assert rows[0] == ("Typ", "Klatka", "Wiadomość", "Poziom")
+        assert rows[1][:2] == ("width_warning", 12)
+
+    def test_raw_alert_sheet(self, generator, result):
+        expected = load_workbook(generator.generate_excel(result, "cells.xlsx"))["Alerty"]
+        generator.RAW_ALERTS_MIN_ROWS = 0
+        ws = load_workbook(generator.generate_excel(result, "raw.xlsx"))["Alerty"]
+        assert list(ws.values) == list(expected.values)
+        assert ws["A2"].fill.fgColor.rgb.endswith("FFC7CE")
+        assert ws["A1"].font.bold
+
+    def test_compression_level(self, tmp_path, result):
+        fast = ReportGenerator(str(tmp_path), excel_compression_level=1)
+        wb = load_workbook(fast.generate_excel(result, "fast.xlsx"))
+        assert wb.sheetnames == ["Podsumowanie", "Segmenty", "Alerty", "Wykres"]
+
+
+class TestCsvReport:
+    def test_rows(self, generator, result):
+        with open(generator.generate_csv(result, "report.csv"), encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        assert rows[0][0] == "segment_id"
+        assert len(rows) == 4
+        assert rows[2] == ["2", "10", "20", "250.0", "300.0", "275.0", "625.0", "2"]
+
+
+class TestJsonReport:
+    def test_content(self, generator, result):
+        with open(generator.generate_json(result, "report.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["total_segments"] == 3
+        assert data["segments"][1]["avg_width_px"] == 275.0
+        assert "generated_at" in data
+
+    def test_pretty_matches_compact(self, generator, result):
+        with open(generator.generate_json(result, "compact.json"), encoding="utf-8") as f:
+            compact = json.load(f)
+        with open(generator.generate_json(result, "pretty.json", pretty=True), encoding="utf-8") as f:
+            pretty = json.load(f)
+        compact.pop("generated_at")
+        pretty.pop("generated_at")
+        assert compact == pretty
+
+
+def test_generate_all(generator, result):
+    paths = generator.generate_all(result, "belt")
+    assert set(paths) == {"excel", "csv", "json"}
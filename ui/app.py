@@ -1,103 +1,306 @@
 """Belt Monitor - Web UI (Streamlit)"""
+# requests and pandas are imported where first needed, so the first page
+# paint doesn't wait for them (annotations below are not evaluated)
+from __future__ import annotations
+
+import hashlib
 import os
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
-st.set_page_config(
-    page_title="Belt Monitor",
-    page_icon="🔍",
-    layout="wide"
+# API segment fields -> column labels for the table and the width chart
+SEGMENT_COLUMNS = {
+    "segment_id": "ID",
+    "frame_start": "Start",
+    "frame_end": "Koniec",
+    "min_width_px": "Min (px)",
+    "max_width_px": "Max (px)",
+    "avg_width_px": "Śr. (px)",
+    "measurement_count": "Pomiary",
+}
+CHART_COLUMNS = {"min_width_px": "Min", "max_width_px": "Max", "avg_width_px": "Średnia"}
+
+# Single-element KPI row laid out like st.metric columns
+KPI_ROW_HTML = '<div style="display:flex;gap:1rem;margin-bottom:1rem">{}</div>'
+KPI_HTML = (
+    '<div style="flex:1">'
+    '<div style="font-size:0.875rem;opacity:0.7">{label}</div>'
+    '<div style="font-size:2.25rem;line-height:1.2">{value}</div>'
+    '</div>'
 )
 
-st.title("🔍 Belt Monitor - Monitoring Taśmy Przenośnika")
+# Report downloads: (API format, button label, file extension)
+REPORT_DOWNLOADS = (
+    ("excel", "📊 Excel", "xlsx"),
+    ("csv", "📄 CSV", "csv"),
+    ("json", "📋 JSON", "json"),
+)
 
-# Sidebar configuration
-st.sidebar.header("Konfiguracja")
-min_width = st.sidebar.slider("Min. szerokość (px)", 50, 500, 100)
-max_width = st.sidebar.slider("Max. szerokość (px)", 500, 3000, 2000)
-seam_threshold = st.sidebar.slider("Czułość detekcji szwów", 0.1, 1.0, 0.3)
-sample_rate = st.sidebar.slider("Sample rate", 1, 30, 1)
+# Compact numeric dtypes for the segments frame (smaller Arrow payload)
+SEGMENT_DTYPES = {
+    "segment_id": "int32",
+    "frame_start": "int32",
+    "frame_end": "int32",
+    "min_width_px": "float32",
+    "max_width_px": "float32",
+    "avg_width_px": "float32",
+    "measurement_count": "int32",
+}
+# Widths are rounded to 2 decimals by the API; float32 must not show more
+WIDTH_COLUMN_CONFIG = {
+    SEGMENT_COLUMNS[col]: st.column_config.NumberColumn(format="%.2f")
+    for col in CHART_COLUMNS
+}
 
-# File upload
-st.header("📤 Załaduj plik do analizy")
-uploaded_file = st.file_uploader(
-    "Wybierz plik wideo lub obraz",
-    type=["mp4", "avi", "mov", "jpg", "jpeg", "png"]
-)
 
-if uploaded_file:
-    if st.button("🚀 Rozpocznij analizę", type="primary"):
-        with st.spinner("Analizuję..."):
-            try:
-                files = {"file": (uploaded_file.name, uploaded_file.getvalue())}
-                params = {
-                    "min_width_threshold": min_width,
-                    "max_width_threshold": max_width,
-                    "seam_threshold": seam_threshold,
-                    "sample_rate": sample_rate
-                }
-                response = requests.post(
-                    f"{API_URL}/api/v1/analyze",
-                    files=files,
-                    params=params,
-                    timeout=300
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    st.success(f"✅ Analiza zakończona! ID: {result['analysis_id']}")
-                    st.session_state["result"] = result
-                else:
-                    st.error(f"Błąd: {response.text}")
-            except Exception as e:
-                st.error(f"Błąd połączenia: {e}")
+@st.cache_resource
+def get_http() -> requests.Session:
+    """HTTP session shared across reruns and user sessions (keep-alive pooling)"""
+    import requests
+    
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-# Display results
-if "result" in st.session_state:
-    result = st.session_state["result"]
+
+class AnalysisError(Exception):
+    """API rejected the analysis request"""
+
+
+@st.cache_data(show_spinner=False, max_entries=16, ttl=3600)
+def run_analysis(file_digest: str, file_name: str, params: tuple, _file) -> dict:
+    """
+    Send a file to the API for analysis. Cached on the file's content digest
+    and the parameters, so reruns with unchanged inputs skip the upload;
+    _file is the upload itself and is left out of the cache key.
+    """
+    from requests_toolbelt import MultipartEncoder
+    
+    # Stream the upload in chunks instead of copying it into the request body:
+    # the encoder read()s the uploaded file itself, so neither getvalue() nor
+    # a BytesIO(getbuffer()) wrapper (which would copy the view) is needed
+    _file.seek(0)
+    encoder = MultipartEncoder(fields={
+        "file": (file_name, _file, _file.type or "application/octet-stream")
+    })
+    response = get_http().post(
+        f"{API_URL}/api/v1/analyze",
+        data=encoder,
+        headers={"Content-Type": encoder.content_type},
+        params=dict(params),
+        timeout=300
+    )
+    if response.status_code != 200:
+        raise AnalysisError(response.text)
+    return orjson.loads(response.content)
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Background workers for analysis requests, shared by all sessions"""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def _with_script_ctx(ctx, fn):
+    """Run fn in a worker thread attached to the submitting session's script context"""
+    def run(*args):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    return run
+
+
+@st.fragment(run_every=1.0)
+def analysis_progress():
+    """
+    Poll the background analysis once a second. Only this fragment reruns
+    while the request is in flight, so the rest of the page stays usable.
+    """
+    future = st.session_state["analysis_future"]
+    if not future.done():
+        st.status("Analizuję...", state="running")
+        return
+    
+    del st.session_state["analysis_future"]
+    key = st.session_state.pop("analysis_key")
+    try:
+        result = future.result()
+        st.session_state["result"] = result
+        st.session_state.setdefault("seen_results", {})[key] = result
+        st.session_state["analysis_notice"] = ("success", f"✅ Analiza zakończona! ID: {result['analysis_id']}")
+    except AnalysisError as e:
+        st.session_state["analysis_notice"] = ("error", f"Błąd: {e}")
+    except Exception as e:
+        st.session_state["analysis_notice"] = ("error", f"Błąd połączenia: {e}")
+    st.rerun()
+
+
+@st.cache_data(show_spinner=False, max_entries=48)
+def fetch_report(analysis_id: str, fmt: str) -> bytes:
+    """Report file from the API, fetched once per analysis and format (results don't change)"""
+    response = get_http().get(f"{API_URL}/api/v1/reports/{analysis_id}/{fmt}", timeout=120)
+    response.raise_for_status()
+    return response.content
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def segments_frame(analysis_id: str, _segments: list) -> pd.DataFrame:
+    """
+    Segments of one analysis as a compact numeric frame, built once per
+    analysis_id (results don't change) instead of on every rerun.
+    from_records infers int64/float64 columns directly (no object dtype).
+    """
+    import pandas as pd
+    
+    return pd.DataFrame.from_records(_segments, columns=list(SEGMENT_COLUMNS)).astype(SEGMENT_DTYPES)
+
+
+@st.fragment
+def render_results(result: dict):
+    """Analysis results; widgets in here rerun only this fragment"""
+    import requests
+    
+    segments = result["segments"]
+    alerts = result["alerts"]
+    analysis_id = result["analysis_id"]
     
     st.header("📊 Wyniki analizy")
     
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Segmenty", result["total_segments"])
-    col2.metric("Klatki", result["total_frames"])
-    col3.metric("FPS", f"{result['fps']:.1f}")
-    col4.metric("Alerty", len(result["alerts"]))
+    # All KPIs in one element instead of four column containers + metrics
+    kpis = {
+        "Segmenty": result["total_segments"],
+        "Klatki": result["total_frames"],
+        "FPS": f"{result['fps']:.1f}",
+        "Alerty": len(alerts),
+    }
+    st.markdown(
+        KPI_ROW_HTML.format("".join(KPI_HTML.format(label=label, value=value)
+                                    for label, value in kpis.items())),
+        unsafe_allow_html=True
+    )
     
     # Segments table
-    if result["segments"]:
+    if segments:
         st.subheader("📋 Segmenty")
-        df = pd.DataFrame(result["segments"])
-        df.columns = ["ID", "Start", "Koniec", "Min (px)", "Max (px)", "Śr. (px)", "Pomiary"]
-        st.dataframe(df, use_container_width=True)
+        # One frame from the API payload; table and chart are views of it
+        df = segments_frame(analysis_id, segments)
+        st.dataframe(
+            df.rename(columns=SEGMENT_COLUMNS),
+            use_container_width=True,
+            column_config=WIDTH_COLUMN_CONFIG
+        )
         
         # Chart
         st.subheader("📈 Wykres szerokości")
-        chart_df = pd.DataFrame({
-            "Segment": [s["segment_id"] for s in result["segments"]],
-            "Min": [s["min_width_px"] for s in result["segments"]],
-            "Max": [s["max_width_px"] for s in result["segments"]],
-            "Średnia": [s["avg_width_px"] for s in result["segments"]]
-        })
-        st.line_chart(chart_df.set_index("Segment"))
+        # Plain column arrays with an explicit x: no reindexed/renamed frame copy
+        chart_data = {"Segment": df["segment_id"].to_numpy()}
+        chart_data.update((label, df[col].to_numpy()) for col, label in CHART_COLUMNS.items())
+        st.line_chart(chart_data, x="Segment")
     
     # Alerts
-    if result["alerts"]:
+    if alerts:
         st.subheader("⚠️ Alerty")
-        for alert in result["alerts"]:
-            st.warning(f"[{alert['severity']}] Klatka {alert.get('frame', 'N/A')}: {alert['message']}")
+        # One element for all alerts instead of one st.warning block each
+        st.markdown("\n\n".join(
+            f"> ⚠️ **[{alert['severity']}]** Klatka {alert.get('frame', 'N/A')}: {alert['message']}"
+            for alert in alerts
+        ))
     
     # Download buttons
     st.subheader("📥 Pobierz raporty")
-    col1, col2, col3 = st.columns(3)
-    
-    analysis_id = result["analysis_id"]
-    col1.markdown(f"[📊 Excel]({API_URL}/api/v1/reports/{analysis_id}/excel)")
-    col2.markdown(f"[📄 CSV]({API_URL}/api/v1/reports/{analysis_id}/csv)")
-    col3.markdown(f"[📋 JSON]({API_URL}/api/v1/reports/{analysis_id}/json)")
+    # Reports are generated by the API, so each is fetched only once asked for
+    requested = st.session_state.setdefault("requested_reports", set())
+    for col, (fmt, label, ext) in zip(st.columns(3), REPORT_DOWNLOADS):
+        key = (analysis_id, fmt)
+        # One slot per format: the prepare button is replaced by the download
+        slot = col.empty()
+        if key not in requested:
+            if not slot.button(f"{label} – przygotuj", key=f"prepare_{fmt}", use_container_width=True):
+                continue
+            requested.add(key)
+        try:
+            with slot, st.spinner("Generowanie raportu..."):
+                data = fetch_report(analysis_id, fmt)
+        except requests.RequestException as e:
+            requested.discard(key)
+            slot.error(f"{label}: {e}")
+            continue
+        slot.download_button(label, data, file_name=f"belt_report_{analysis_id}.{ext}",
+                             use_container_width=True)
+
+
+st.set_page_config(
+    page_title="Belt Monitor",
+    page_icon="🔍",
+    layout="wide"
+)
+
+st.title("🔍 Belt Monitor - Monitoring Taśmy Przenośnika")
+
+# Sidebar configuration; a form so dragging a slider doesn't rerun the
+# script, values take effect (one rerun) when the form is submitted
+st.sidebar.header("Konfiguracja")
+with st.sidebar.form("config"):
+    min_width = st.slider("Min. szerokość (px)", 50, 500, 100)
+    max_width = st.slider("Max. szerokość (px)", 500, 3000, 2000)
+    seam_threshold = st.slider("Czułość detekcji szwów", 0.1, 1.0, 0.3)
+    sample_rate = st.slider("Sample rate", 1, 30, 1)
+    st.form_submit_button("Zastosuj")
+
+# File upload
+st.header("📤 Załaduj plik do analizy")
+uploaded_file = st.file_uploader(
+    "Wybierz plik wideo lub obraz",
+    type=["mp4", "avi", "mov", "jpg", "jpeg", "png"]
+)
+
+if uploaded_file:
+    pending = "analysis_future" in st.session_state
+    if st.button("🚀 Rozpocznij analizę", type="primary", disabled=pending):
+        params = {
+            "min_width_threshold": min_width,
+            "max_width_threshold": max_width,
+            "seam_threshold": seam_threshold,
+            "sample_rate": sample_rate
+        }
+        # Hash the upload in place (getbuffer is a zero-copy view)
+        with uploaded_file.getbuffer() as view:
+            digest = hashlib.blake2b(view, digest_size=16).hexdigest()
+        key = (digest, tuple(sorted(params.items())))
+        
+        # Same file and settings already analyzed in this session: skip the upload
+        seen = st.session_state.setdefault("seen_results", {})
+        if key in seen:
+            result = seen[key]
+            st.session_state["result"] = result
+            st.session_state["analysis_notice"] = ("success", f"✅ Analiza zakończona! ID: {result['analysis_id']}")
+        else:
+            st.session_state["analysis_key"] = key
+            st.session_state["analysis_future"] = get_executor().submit(
+                _with_script_ctx(get_script_run_ctx(), run_analysis),
+                digest, uploaded_file.name, key[1], uploaded_file
+            )
+
+if "analysis_future" in st.session_state:
+    analysis_progress()
+
+notice = st.session_state.pop("analysis_notice", None)
+if notice is not None:
+    level, message = notice
+    if level == "success":
+        st.success(message)
+    else:
+        st.error(message)
+
+# Display results
+if "result" in st.session_state:
+    render_results(st.session_state["result"])
 
 # Footer
 st.divider()